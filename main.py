@@ -3,18 +3,32 @@
 # - Actionsログに PASS/WARN/FAIL を出力
 # - Bootflat Selecter対応: jQuery selecter('select', value) + change発火
 # - 「地域 → (待機) → 都道府県 → 月 → 日 → 検索」で抽出
-# - START_YM 以降の月 × 全日レンジを総当たり
+# - START_YM 以降の月 × 全日レンジを総当たり（asyncio並列・MAX_CONCURRENCY文脈）
 # - Gmail通知は SEND_EMAIL=true の時のみ
 
-import os, re, ssl, smtplib
+import asyncio
+import hashlib
+import json
+import os, random, re, sqlite3, ssl, time
+from dataclasses import dataclass
 from email.message import EmailMessage
-from datetime import datetime
-from playwright.sync_api import sync_playwright
+from functools import lru_cache
+from urllib.parse import urljoin
+import aiohttp
+import aiosmtplib
+from playwright.async_api import async_playwright
+from selectolax.parser import HTMLParser
 
 # ===== 固定URL =====
 IPA_LOGIN_URL    = "https://itee.ipa.go.jp/ipa/user/public/login/"
 IPA_FE_ENTRY_URL = "https://itee.ipa.go.jp/ipa/user/public/cbt_entry/fc_fe/"
 
+# ログイン済みセッション（Cookie/localStorage）の保存先。
+# 有効なら次回実行はログイン〜申込導線を丸ごと省略してエリア・日程へ直行する。
+# IPA側のセッションTTLを踏まえ、24時間より古いファイルは信用しない。
+STATE_FILE   = os.environ.get("STATE_PATH", "state.json")
+STATE_TTL_SEC = 24 * 3600
+
 # ===== 必須/任意環境変数 =====
 def need(name: str) -> str:
     v = os.environ.get(name, "")
@@ -36,12 +50,44 @@ TARGET_CENTERS = [s.strip() for s in os.environ.get(
     "沖縄県庁前テストセンター,那覇テストセンター,OAC沖縄校テストセンター"
 ).split(",") if s.strip()]
 
+# 検索の並列コンテキスト数（攻めすぎるとサーバに優しくないので控えめに）
+MAX_CONCURRENCY = int(os.environ.get("MAX_CONCURRENCY", "4"))
+
+# HTTP直叩きパスの同時検索POST数（こちらはページを持たないぶん多めでよい）
+HTTP_CONCURRENCY = int(os.environ.get("HTTP_CONCURRENCY", "10"))
+
+# ===== タイムアウト方針 =====
+# - 要素操作のデフォルトは5秒: 候補セレクタの空振り（count()後のfill等）が
+#   30秒待ちにならないようにする。待ちが要る箇所は個別にtimeoutを渡す。
+# - ナビゲーションは10秒: IPAサイトの実測で十分、ハングだけを検出する。
+DEFAULT_TIMEOUT_MS = 5000
+NAV_TIMEOUT_MS     = 10000
+
+def set_page_timeouts(page):
+    page.set_default_timeout(DEFAULT_TIMEOUT_MS)
+    page.set_default_navigation_timeout(NAV_TIMEOUT_MS)
+
+# 全会場で空きが見つかった月も最後まで総当たりしたい時は EXHAUSTIVE=true
+EXHAUSTIVE = truthy("EXHAUSTIVE")
+
+# HTTP_MODE=true でHTTP直叩きを先に試す（CIのデフォルト）。
+# 落とすとChromiumを起動するPlaywrightパスのみで動く。
+HTTP_MODE = truthy("HTTP_MODE")
+
 SEND_EMAIL         = truthy("SEND_EMAIL")
 GMAIL_ADDRESS      = os.environ.get("GMAIL_ADDRESS", "")
 GMAIL_APP_PASSWORD = os.environ.get("GMAIL_APP_PASSWORD", "")
 
 # ===== ログ/アノテーション =====
-def ts() -> str: return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%SZ")
+# ログは秒単位表示なので、同一秒内はstrftimeし直さず前回結果を使い回す。
+# （datetime.utcnow()は3.12で非推奨になったのでtime.gmtime基準に変更）
+_ts_cache = [0, ""]
+def ts() -> str:
+    s = int(time.time())
+    if s != _ts_cache[0]:
+        _ts_cache[0] = s
+        _ts_cache[1] = time.strftime("%Y-%m-%d %H:%M:%SZ", time.gmtime(s))
+    return _ts_cache[1]
 def info(msg: str): print(f"[{ts()}] {msg}", flush=True)
 def pass_mark(step: str, detail: str = ""): print(f"::notice title={step}::PASS {detail}")
 def warn_mark(step: str, detail: str = ""): print(f"::warning title={step}::{detail}")
@@ -69,61 +115,242 @@ LOGIN_PW_CAND = [
     "input[autocomplete='current-password']",
     "input[type='password']",
 ]
-def fill_any(page, selectors, value, step):
-    for sel in selectors:
-        loc = page.locator(sel).first
-        if loc.count():
-            try:
-                loc.fill(value, timeout=5000)  # 非表示でも入ることがあるため可視待ちはしない
-                pass_mark(step, f"{sel} で入力")
-                return True
-            except Exception as e:
-                warn_mark(step, f"{sel} 失敗: {e}")
+async def fill_any(page, selectors, value, step):
+    # locator.fill は可視・安定のactionability待ちを挟むため、隠しinput相手だと
+    # セレクタごとに数秒の空振りを払う。evaluateで直接値を入れてinput/changeを
+    # 発火させれば、候補全体を1回の往復で試せる。
+    sel = await page.evaluate(
+        """
+        ({ sels, val }) => {
+          for (const s of sels) {
+            const el = document.querySelector(s);
+            if (el) {
+              el.value = val;
+              el.dispatchEvent(new Event('input', { bubbles: true }));
+              el.dispatchEvent(new Event('change', { bubbles: true }));
+              return s;
+            }
+          }
+          return null;
+        }
+        """,
+        {"sels": selectors, "val": value}
+    )
+    if sel:
+        pass_mark(step, f"{sel} で入力")
+        return True
     fail_mark(step, f"{step} 候補全滅"); raise RuntimeError(f"{step} 失敗")
 
 # ===== ユーティリティ =====
-def send_gmail(subject: str, body: str):
+SSL_CTX = ssl.create_default_context()  # TLSコンテキストは使い回す（毎回の構築を避ける）
+
+# 通知済みスロットの控え（行ハッシュ→通知時刻）。cronが同じ結果を拾い
+# 続けても再送せず、枠が残り続ける場合は RENOTIFY_DAYS 経過で再通知する。
+# メール全体のダイジェスト比較と違い、新規枠が1件混ざればその枠だけ飛ぶ。
+SLOT_DB_FILE  = os.environ.get("SLOT_DB_FILE", ".slots.db")
+RENOTIFY_DAYS = int(os.environ.get("RENOTIFY_DAYS", "3"))
+
+_slot_db = None
+
+def _slots_db() -> sqlite3.Connection:
+    global _slot_db
+    if _slot_db is None:
+        _slot_db = sqlite3.connect(SLOT_DB_FILE)
+        _slot_db.execute(
+            "CREATE TABLE IF NOT EXISTS notified (h BLOB PRIMARY KEY, ts INTEGER)")
+    return _slot_db
+
+def _slot_hash(line: str) -> bytes:
+    return hashlib.blake2b(line.encode(), digest_size=16).digest()
+
+def unnotified_lines(lines) -> list:
+    """未通知、または通知からRENOTIFY_DAYS以上経った行だけ返す。"""
+    db, cutoff = _slots_db(), int(time.time()) - RENOTIFY_DAYS * 86400
+    out = []
+    for lb in lines:
+        row = db.execute("SELECT ts FROM notified WHERE h=?",
+                         (_slot_hash(lb),)).fetchone()
+        if row is None or row[0] < cutoff:
+            out.append(lb)
+    return out
+
+def remember_lines(lines):
+    now = int(time.time())
+    db = _slots_db()
+    db.executemany("INSERT OR REPLACE INTO notified VALUES (?, ?)",
+                   [(_slot_hash(lb), now) for lb in lines])
+    db.commit()
+
+# SMTP接続は使い回す（TLSハンドシェイク+AUTHを複数通で払わない）
+_smtp_client = None
+
+async def _smtp():
+    global _smtp_client
+    if _smtp_client is None or not _smtp_client.is_connected:
+        _smtp_client = aiosmtplib.SMTP(
+            hostname="smtp.gmail.com", port=465, use_tls=True, tls_context=SSL_CTX)
+        await _smtp_client.connect()
+        await _smtp_client.login(GMAIL_ADDRESS, GMAIL_APP_PASSWORD)
+    return _smtp_client
+
+async def send_gmail(subject: str, body: str) -> bool:
+    """送信できたらTrue。呼び出し側はTrueの時だけ通知済み控えを更新する。"""
     if not SEND_EMAIL:
-        warn_mark("通知(メール)", "SEND_EMAIL=false のため送信スキップ"); return
+        warn_mark("通知(メール)", "SEND_EMAIL=false のため送信スキップ"); return False
     if not (GMAIL_ADDRESS and GMAIL_APP_PASSWORD):
-        fail_mark("通知(メール)", "GMAIL_ADDRESS/GMAIL_APP_PASSWORD 未設定"); return
+        fail_mark("通知(メール)", "GMAIL_ADDRESS/GMAIL_APP_PASSWORD 未設定"); return False
     try:
         msg = EmailMessage()
         msg["Subject"] = subject; msg["From"] = GMAIL_ADDRESS; msg["To"] = GMAIL_ADDRESS
         msg.set_content(body)
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=ssl.create_default_context()) as s:
-            s.login(GMAIL_ADDRESS, GMAIL_APP_PASSWORD); s.send_message(msg)
+
+        # SMTPが詰まっても巡回全体を道連れにしない（接続〜送信で10秒上限）
+        async def _do_send():
+            s = await _smtp()
+            await s.send_message(msg)
+        await asyncio.wait_for(_do_send(), timeout=10)
         pass_mark("通知(メール)", "SMTP送信成功")
+        return True
     except Exception as e:
+        # タイムアウトで途中キャンセルされた接続は信用せず作り直す
+        global _smtp_client
+        _smtp_client = None
         fail_mark("通知(メール)", f"例外: {e}")
+        return False
+
+# ホットパスで使う述語は起動時に1回だけ構築する
+_MONTH_RE  = re.compile(r"(\d{4})年\s*(\d{1,2})月")
+_CENTER_RE = re.compile("|".join(map(re.escape, TARGET_CENTERS)))
+_sy, _sm   = map(int, START_YM.split("-"))
+_START_KEY = _sy * 12 + _sm  # 年月は year*12+month のパック整数で比較
 
+@lru_cache(maxsize=256)  # 同じラベルがワーカー/パスをまたいで繰り返し来る
 def parse_month_label(lb: str):
-    m = re.search(r"(\d{4})年\s*(\d{1,2})月", lb)
-    return (int(m.group(1)), int(m.group(2))) if m else None
+    """'2025年11月' → year*12+month のパック整数（解釈できなければNone）"""
+    m = _MONTH_RE.search(lb)
+    return int(m.group(1)) * 12 + int(m.group(2)) if m else None
 
 # ===== Bootflat Selecter を介して選択 =====
-def select_by_label(page, select_id: str, label_text: str) -> bool:
+# ヘルパJSはコンテキスト生成時にadd_init_scriptで常駐させる。
+# 以後のevaluateは `window.__xxx(...)` の呼び出しだけになり、
+# 呼び出しごとにJS本体をCDPで送らずに済む。
+INIT_HELPERS_JS = r"""
+window.__navProbe = () => {
+  const txt = el => (el.textContent || el.value || '').trim();
+  const links = Array.from(document.links || []);
+  const clickables = Array.from(document.querySelectorAll('a, button, input[type=submit]'));
+  const labels = Array.from(document.querySelectorAll('label'));
+  const hasLink = re => links.some(a => re.test(txt(a)));
+  const hasClick = re => clickables.some(b => re.test(txt(b)));
+  return {
+    feCbt:   hasLink(/基本情報技術者試験\(FE\)\s*CBT試験申込/),
+    fe:      hasLink(/基本情報技術者試験\(FE\)/),
+    cbt:     hasLink(/CBT試験申込/),
+    reopen:  hasClick(/申込再開/),
+    select:  hasClick(/選択する|入力はこちらから/),
+    next:    hasClick(/次へ/),
+    gakusei: labels.some(l => txt(l) === '学生'),
+    agree:   labels.some(l => txt(l) === '同意する'),
+  };
+};
+window.__optsOf = sid => {
+  const el = document.getElementById(sid);
+  if (!el) return [];
+  return Array.from(el.options || []).map(o => ({
+    value: o.value, label: (o.textContent||'').trim()
+  }));
+};
+window.__selByVal = (sid, val) => {
+  const $ = window.jQuery;
+  const el = document.getElementById(sid);
+  if (!el) return 'NO_ELEM';
+  try {
+    if ($ && typeof $(el).selecter === 'function') {
+      $(el).selecter('select', val);
+    } else {
+      el.value = val;
+    }
+    el.dispatchEvent(new Event('change', { bubbles: true }));
+    return 'OK';
+  } catch (e) { return 'ERR:' + e; }
+};
+window.__selByLabel = (sid, label) => {
+  const opt = window.__optsOf(sid).find(o => o.label === label);
+  return opt ? window.__selByVal(sid, opt.value) : 'NO_OPT';
+};
+window.__parseResultTable = (centers) => {
+  const tbl = document.querySelector('table');
+  if (!tbl) return null;
+  // centersを渡された場合は対象会場の行だけ直列化する
+  // （無関係な会場の行×セルをCDP境界越しに運ばない）
+  return Array.from(tbl.rows).map(r => {
+    const a = r.querySelector('a');
+    const name = ((a ? a.textContent : (r.cells[0] ? r.cells[0].textContent : '')) || '').trim();
+    return { r, name };
+  }).filter(({name}) =>
+    !centers || !centers.length || centers.some(c => name.includes(c))
+  ).map(({r, name}) => {
+    const cells = Array.from(r.querySelectorAll('a,button,td'))
+      .filter(c => (c.textContent || '').includes('○'));
+    return {
+      name,
+      slots: cells.map(c => ({
+        t: (c.textContent || '').trim(),
+        href: c.getAttribute('href') || ''
+      }))
+    };
+  });
+};
+// 月/日選択→検索→結果待ち→表のJSON化までをページ内で完結させる
+// （1回の(月,日)あたりCDP往復1回。結果はMutationObserverで待つ）
+window.__probeYmDt = async (ymVal, dtVal, timeoutMs, centers) => {
+  if (ymVal !== null && ymVal !== undefined) {
+    const r1 = window.__selByVal('select_ym', ymVal);
+    if (r1 !== 'OK') return { status: 'YM_' + r1 };
+  }
+  const r2 = window.__selByVal('select_dt', dtVal);
+  if (r2 !== 'OK') return { status: 'DT_' + r2 };
+  const btn = document.querySelector('#ACT_search')
+    || Array.from(document.querySelectorAll('button, input[type=submit]'))
+         .find(b => ((b.textContent || b.value || '')).includes('検索'));
+  if (!btn) return { status: 'NO_BTN' };
+  const ready = () => document.querySelector('#calendar tbody tr')
+    || document.querySelector('.no-site');
+  const done = new Promise(resolve => {
+    const obs = new MutationObserver(() => {
+      if (ready()) { obs.disconnect(); resolve(true); }
+    });
+    obs.observe(document.body, { childList: true, subtree: true });
+    setTimeout(() => { obs.disconnect(); resolve(!!ready()); }, timeoutMs);
+  });
+  btn.click();
+  if (!(await done)) return { status: 'TIMEOUT' };
+  return { status: 'OK', rows: window.__parseResultTable(centers) || [] };
+};
+"""
+
+# 抽出に不要なリソースはネットワーク層で遮断する（転送・パース量を削る）。
+# BootflatのラッパーDOMはJSが組み立てるのでCSSなしでも動作する。
+_BLOCK_RESOURCE_TYPES = {"image", "font", "media", "stylesheet"}
+_ANALYTICS_RE = re.compile(r"google-analytics|googletagmanager|doubleclick")
+
+async def _route_filter(route):
+    req = route.request
+    if req.resource_type in _BLOCK_RESOURCE_TYPES or _ANALYTICS_RE.search(req.url):
+        await route.abort()
+    else:
+        await route.continue_()
+
+async def new_context_with_helpers(browser, **kwargs):
+    ctx = await browser.new_context(**kwargs)
+    await ctx.add_init_script(INIT_HELPERS_JS)
+    await ctx.route("**/*", _route_filter)
+    return ctx
+
+async def select_by_label(page, select_id: str, label_text: str) -> bool:
     """display:none の <select> も jQuery selecter で選択し、必ず change を発火"""
-    res = page.evaluate(
-        """
-        ({ sid, label }) => {
-          const $ = window.jQuery;
-          const el = document.getElementById(sid);
-          if (!el) return 'NO_ELEM';
-          const opt = Array.from(el.options||[]).find(o => (o.textContent||'').trim() === label);
-          if (!opt) return 'NO_OPT';
-          const val = opt.value;
-          try {
-            if ($ && typeof $(el).selecter === 'function') {
-              $(el).selecter('select', val);
-            } else {
-              el.value = val;
-            }
-            el.dispatchEvent(new Event('change', { bubbles: true }));
-            return 'OK';
-          } catch (e) { return 'ERR:' + e; }
-        }
-        """,
+    res = await page.evaluate(
+        "a => window.__selByLabel(a.sid, a.label)",
         {"sid": select_id, "label": label_text}
     )
     if res == "OK":
@@ -132,179 +359,565 @@ def select_by_label(page, select_id: str, label_text: str) -> bool:
     fail_mark("選択", f"{select_id} '{label_text}' 失敗: {res}")
     return False
 
-def options_of(page, select_id: str):
-    return page.evaluate(
-        """
-        sid => {
-          const el = document.getElementById(sid);
-          if (!el) return [];
-          return Array.from(el.options || []).map(o => ({
-            value: o.value, label: (o.textContent||'').trim()
-          }));
-        }
-        """,
-        select_id
+async def select_by_value(page, select_id: str, value: str, label_text: str = "") -> bool:
+    """ラベル→値の解決を済ませてある前提で、値だけ渡して選択（JS側はO(1)）"""
+    res = await page.evaluate(
+        "a => window.__selByVal(a.sid, a.val)",
+        {"sid": select_id, "val": value}
     )
+    if res == "OK":
+        pass_mark("選択", f"{select_id} ← {label_text or value}")
+        return True
+    fail_mark("選択", f"{select_id} '{label_text or value}' 失敗: {res}")
+    return False
+
+async def label_value_map(page, select_id: str) -> dict:
+    """{ラベル: value} を1回のevaluateで取得してキャッシュ用に返す"""
+    return {o["label"]: o["value"] for o in await options_of(page, select_id)}
+
+async def options_of(page, select_id: str):
+    return await page.evaluate("sid => window.__optsOf(sid)", select_id)
 
 # ===== 導線（エリア・日程選択ページへ確実に到達） =====
-def on_area_date(page) -> bool:
-    if page.get_by_text("エリア・日程選択", exact=False).first.count():
-        return True
-    has_region = page.locator("tr", has_text="地域").first.locator("select").count() > 0
-    has_pref   = page.locator("tr", has_text="都道府県").first.locator("select").count() > 0
-    has_search = page.get_by_role("button", name="検索").first.count() > 0
-    return has_region and has_pref and has_search
+async def click_and_wait_for(loc, page, wait_css: str, timeout: int = 10000):
+    """クリック後、次ステップが実際に必要とする要素の出現だけを待つ。
+    期待要素が出なければdomcontentloadedに落として前進は保証する。"""
+    await loc.click()
+    try:
+        await page.locator(wait_css).first.wait_for(state="attached", timeout=timeout)
+    except Exception:
+        await page.wait_for_load_state("domcontentloaded")
+
+async def try_click(loc, timeout: int = 1500) -> bool:
+    """任意ステップ用: 要素が短時間で可視になればクリックしてTrue、
+    出なければ静かにFalse。count()での在否確認と違い、遅れて描画される
+    要素も拾えるし、既定30秒のタイムアウトを抱え込まない。"""
+    try:
+        await loc.wait_for(state="visible", timeout=timeout)
+    except Exception:
+        return False
+    await loc.click()
+    return True
+
+# get_by_role / filter に渡すパターンはモジュール読込時に1回だけコンパイル
+_RE_FE_CBT = re.compile(r"基本情報技術者試験\(FE\)\s*CBT試験申込")
+_RE_FE     = re.compile(r"基本情報技術者試験\(FE\)")
+_RE_CBT    = re.compile(r"CBT試験申込")
+_RE_FE_ROW = re.compile(r"基本情報技術者試験\(FE\).*科目A.*科目B")
+
+# ログイン成否の判定に2箇所で使うのでセレクタ文字列は1つに寄せる
+LOGOUT_SEL = "a:has-text('ログアウト'), button:has-text('ログアウト')"
+async def on_area_date(page) -> bool:
+    # タイトル文言・地域/都道府県select・検索ボタンの存在を1回のevaluateで判定
+    # （count()を4連発するとそれだけでCDP往復4回かかる）
+    res = await page.evaluate(
+        """
+        sels => ({
+          flags: sels.map(s => !!document.querySelector(s)),
+          title: ((document.body && document.body.innerText) || '').includes('エリア・日程選択'),
+          search: Array.from(document.querySelectorAll('button, input[type=submit], a'))
+            .some(b => ((b.textContent || b.value || '')).includes('検索')),
+        })
+        """,
+        ["#select_area", "#select_pref"]
+    )
+    return res["title"] or (all(res["flags"]) and res["search"])
 
-def goto_area_date_page(page) -> bool:
-    group_start("FE申込導線")
+async def goto_area_date_page(page, quiet: bool = False) -> bool:
+    if not quiet:
+        group_start("FE申込導線")
     try:
-        link = page.get_by_role("link", name=re.compile(r"基本情報技術者試験\(FE\)\s*CBT試験申込"))
-        if link.first.count():
-            link.first.click(); page.wait_for_load_state("domcontentloaded")
+        # 存在確認は __navProbe の1回のevaluateでまとめて取り、クリックだけ個別に行う
+        st = await page.evaluate("() => window.__navProbe()")
+        if st["feCbt"]:
+            # 直リンクはエリア・日程に着くはずなので、selectの出現だけ待つ
+            await click_and_wait_for(
+                page.get_by_role("link", name=_RE_FE_CBT).first, page, "#select_area")
+        elif st["fe"]:
+            await page.get_by_role("link", name=_RE_FE).first.click()
+            await page.wait_for_load_state("domcontentloaded")
+            if (await page.evaluate("() => window.__navProbe()"))["cbt"]:
+                await page.get_by_role("link", name=_RE_CBT).first.click()
+                await page.wait_for_load_state("domcontentloaded")
         else:
-            fe = page.get_by_role("link", name=re.compile(r"基本情報技術者試験\(FE\)"))
-            if fe.first.count():
-                fe.first.click(); page.wait_for_load_state("domcontentloaded")
-                l2 = page.get_by_role("link", name=re.compile(r"CBT試験申込"))
-                if l2.first.count():
-                    l2.first.click(); page.wait_for_load_state("domcontentloaded")
-            else:
-                page.goto(IPA_FE_ENTRY_URL, wait_until="domcontentloaded")
+            await page.goto(IPA_FE_ENTRY_URL, wait_until="domcontentloaded")
         info(f"到達1: {page.url}")
-        if on_area_date(page):
+        if await on_area_date(page):
             pass_mark("導線", "到達(エリア・日程)"); return True
 
-        btn = page.get_by_role("button", name=re.compile(r"申込再開"))
-        if not btn.first.count():
-            btn = page.locator("a:has-text('申込再開'), button:has-text('申込再開')")
-        if btn.first.count():
-            btn.first.click(); page.wait_for_load_state("domcontentloaded")
-        info(f"到達2: {page.url}")
-        if on_area_date(page):
-            pass_mark("導線", "申込再開→到達"); return True
-
-        selbtn = page.get_by_role("button", name=re.compile(r"選択する|入力はこちらから"))
-        if not selbtn.first.count():
-            selbtn = page.locator("a:has-text('選択する'), a:has-text('入力はこちらから'), button:has-text('選択する')")
-        if selbtn.first.count():
-            selbtn.first.click(); page.wait_for_load_state("domcontentloaded")
-        info(f"到達3: {page.url}")
-
-        row = page.locator("tr").filter(has_text=re.compile(r"基本情報技術者試験\(FE\).*科目A.*科目B"))
-        if row.count() and row.first.get_by_role("button", name="次へ").count():
-            row.first.get_by_role("button", name="次へ").click()
-            page.wait_for_load_state("domcontentloaded")
-        else:
-            nx = page.get_by_role("button", name="次へ")
-            if nx.first.count():
-                nx.first.click(); page.wait_for_load_state("domcontentloaded")
-        info(f"到達4: {page.url}")
-
-        if page.get_by_label("学生", exact=True).first.count():
-            page.get_by_label("学生", exact=True).first.check(); pass_mark("区分選択", "学生")
-        if page.get_by_label("同意する", exact=True).first.count():
-            page.get_by_label("同意する", exact=True).first.check(); pass_mark("同意確認", "同意する")
-        nx = page.get_by_role("button", name="次へ")
-        if nx.first.count():
-            nx.first.click(); page.wait_for_load_state("domcontentloaded")
-        info(f"到達5: {page.url}")
-
-        ok = on_area_date(page)
+        # 申込再開〜同意〜次へは「出てきたら操作して前進」の定型連鎖なので
+        # テーブル駆動で一巡する。出現待ち(1.5秒)とスキップ判定はtry_clickに
+        # 一任し、各ステップの後にエリア・日程へ着いていたらそこで打ち切る。
+        # 形式: (ログ名, 操作, 対象Locator, 代替Locator, クリック後に待つCSS)
+        # クリック対象はCSSの併記列挙ではなくロール照会で引く（アクセシビリティ
+        # ツリー参照なのでCSS総当たりより軽い）。表記ゆれはor_()で束ねる。
+        next_btn = page.get_by_role("button", name="次へ", exact=True).first
+        steps = (
+            ("申込再開", "click",
+             page.get_by_role("link", name="申込再開", exact=True)
+                 .or_(page.get_by_role("button", name="申込再開", exact=True)).first,
+             None, "#select_area"),
+            ("試験選択", "click",
+             page.get_by_role("link", name="選択する", exact=True)
+                 .or_(page.get_by_role("link", name="入力はこちらから", exact=True))
+                 .or_(page.get_by_role("button", name="選択する", exact=True)).first,
+             None, None),
+            ("試験行の次へ", "click",
+             page.locator("tr").filter(has_text=_RE_FE_ROW).first
+                 .get_by_role("button", name="次へ", exact=True),
+             next_btn, None),
+            ("区分選択", "check", page.get_by_label("学生", exact=True).first, None, None),
+            ("同意確認", "check", page.get_by_label("同意する", exact=True).first, None, None),
+            ("次へ", "click", next_btn, None, None),
+        )
+        for name, kind, loc, alt, wait_css in steps:
+            if kind == "check":
+                # チェックボックスはclickだとトグルするのでcheckで冪等に
+                try:
+                    await loc.check(timeout=1500); pass_mark(name, "チェック")
+                except Exception:
+                    pass
+                continue
+            if not (await try_click(loc) or (alt is not None and await try_click(alt))):
+                continue
+            if wait_css:
+                try:
+                    await page.locator(wait_css).first.wait_for(
+                        state="attached", timeout=10000)
+                except Exception:
+                    await page.wait_for_load_state("domcontentloaded")
+            else:
+                await page.wait_for_load_state("domcontentloaded")
+            info(f"{name}: {page.url}")
+            if await on_area_date(page):
+                pass_mark("導線", f"{name}→到達"); return True
+
+        ok = await on_area_date(page)
         if ok: pass_mark("導線", "手順どおり到達")
         else:  warn_mark("導線", "エリア・日程に未到達")
         return ok
     finally:
-        group_end()
+        if not quiet:
+            group_end()
+
+# ===== エリア・日程の選択待ち =====
+PREF_READY_JS = """
+() => {
+  const s = document.querySelector('#select_pref');
+  const w = document.querySelector('#select_pref + .selecter');
+  const okSel = s && s.options && s.options.length > 1;
+  const okWrap = w && w.querySelectorAll('.selecter-item').length > 1;
+  return okSel || okWrap;
+}
+"""
+YMDT_READY_JS = """
+() => {
+  const y  = document.querySelector('#select_ym');
+  const d  = document.querySelector('#select_dt');
+  const yw = document.querySelector('#select_ym + .selecter');
+  const dw = document.querySelector('#select_dt + .selecter');
+  const okY = (y && y.options.length > 1) || (yw && yw.querySelectorAll('.selecter-item').length > 1);
+  const okD = (d && d.options.length > 1) || (dw && dw.querySelectorAll('.selecter-item').length > 1);
+  return okY && okD;
+}
+"""
 
-# ===== メイン =====
-def main():
-    found_lines = []
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context()
-        page = context.new_page()
-        page.set_default_timeout(30000)
+async def select_area_pref(page) -> None:
+    """地域→都道府県を選び、月/日の候補が埋まるまで待つ"""
+    await select_by_label(page, "select_area", REGION_NAME)
+    # 都道府県の候補が埋まるまで（ラッパーも監視）。候補はすぐ入ることが
+    # 多いので、既定100msのポーリングを25msに詰めて検知を早める。
+    await page.wait_for_function(PREF_READY_JS, timeout=30000, polling=25)
+    await select_by_label(page, "select_pref", PREF_NAME)
+    # 月・日が埋まるまで
+    await page.wait_for_function(YMDT_READY_JS, timeout=30000, polling=25)
+
+# ===== 検索・抽出 =====
+async def click_search(page) -> bool:
+    # ページによっては #ACT_search が確実
+    btn = page.locator("#ACT_search").first
+    if not await btn.count():
+        btn = page.get_by_role("button", name="検索").first
+    if not await btn.count():
+        warn_mark("会場検索", "ボタンなし"); return False
+    # 検索POSTの応答だけを待つ（domcontentloaded待ちはサブリソースまで抱え込む）
+    try:
+        async with page.expect_response(
+            lambda r: r.request.method == "POST" and "cbt" in r.url, timeout=20000
+        ):
+            await btn.click()
+    except Exception:
+        # 応答を特定できない構成でも次のDOM待ちでカバーする
+        warn_mark("会場検索", "検索POST応答を特定できず（DOM待ちへフォールバック）")
+    # 結果（表 or no-site）がDOMに付くだけ待てば抽出には十分
+    await page.wait_for_selector(
+        "#calendar tbody tr, .no-site", state="attached", timeout=5000
+    )
+    pass_mark("会場検索", "検索押下"); return True
+
+@dataclass(slots=True, frozen=True)
+class Slot:
+    """検出した空き枠1件。frozen+slotsでset重複排除とメモリ節約を両取り"""
+    name: str
+    month: str
+    day: str
+    text: str
+    href: str
+
+    def line(self) -> str:
+        line = f"{self.name} | {self.month} | {self.day} | {self.text}"
+        return line + (f" | {self.href}" if self.href else "")
+
+def collect_slots(rows, selected_month: str, selected_day: str):
+    """__parseResultTable が返した行JSONを対象会場で絞って Slot に起こす。
+    返り値は (slots, 会場一致数)。一致ゼロは月単位スキップの判断材料になる。"""
+    slots = []
+    matched = 0
+    for row in rows:
+        name = row["name"]
+        if not name or not _CENTER_RE.search(name):
+            continue
+        matched += 1; pass_mark("会場一致", name)
+        if not row["slots"]:
+            warn_mark("枠抽出", f"{name}: 0件"); continue
+        for s in row["slots"]:
+            slots.append(Slot(name, selected_month, selected_day, s["t"], s["href"]))
+        pass_mark("枠抽出", f"{name}: {len(row['slots'])}件")
+    if matched == 0:
+        warn_mark("会場一致", "指定会場ヒットなし（表記ぶれの可能性）")
+    return slots, matched
+
+async def extract_table_slots(page, selected_month: str, selected_day: str):
+    # 対象会場の行だけ1回のevaluateでJSON化して持ち帰る
+    data = await page.evaluate("cs => window.__parseResultTable(cs)", TARGET_CENTERS)
+    if data is None:
+        warn_mark("会場表", "tableなし"); return [], 0
+    return collect_slots(data, selected_month, selected_day)
+
+# ===== HTTP直叩きパス =====
+# ブラウザを立ち上げず、ログイン〜検索のフォームPOSTを直接再現する。
+# エンドポイントは決め打ちせず、実際に返ってきたHTMLのform action / hidden入力
+# （CSRFトークン含む）から都度組み立てる。カスケードselectがXHR供給などで
+# 静的HTMLに揃わない構成なら None を返し、呼び出し側がPlaywrightへ切り替える。
+
+def _hidden_fields(form) -> dict:
+    data = {}
+    for inp in form.css("input[type='hidden']"):
+        name = inp.attributes.get("name")
+        if name:
+            data[name] = inp.attributes.get("value") or ""
+    return data
+
+def _login_form(doc, base_url):
+    """パスワード入力を持つ最初のformから (action, hidden, id欄名, PW欄名) を得る"""
+    for f in doc.css("form"):
+        pw = f.css_first("input[type='password']")
+        if pw is None:
+            continue
+        pw_name = pw.attributes.get("name") or "password"
+        id_name = None
+        for inp in f.css("input"):
+            t = (inp.attributes.get("type") or "text").lower()
+            n = inp.attributes.get("name") or ""
+            if t in ("text", "email") and n:
+                if n in ("loginId", "userId") or "id" in n.lower():
+                    id_name = n; break
+                if id_name is None:
+                    id_name = n
+        if not id_name:
+            continue
+        return (urljoin(base_url, f.attributes.get("action") or ""),
+                _hidden_fields(f), id_name, pw_name)
+    return None
+
+def _select_meta(doc, sid: str):
+    """<select id=sid> の (name属性, [(value, label), ...]) を返す"""
+    el = doc.css_first(f"select#{sid}")
+    if el is None:
+        return None
+    opts = [(o.attributes.get("value") or "", o.text(strip=True))
+            for o in el.css("option")]
+    return el.attributes.get("name") or sid, opts
+
+def _parse_result_html(body: str, m_lb: str, d_lb: str) -> list:
+    """検索結果HTMLを __parseResultTable と同形のJSONに起こして共通整形に渡す"""
+    doc = HTMLParser(body)
+    tbl = doc.css_first("table")
+    if tbl is None:
+        return []
+    rows = []
+    for r in tbl.css("tr"):
+        a = r.css_first("a")
+        td = r.css_first("td")
+        name = a.text(strip=True) if a is not None else (
+            td.text(strip=True) if td is not None else "")
+        # 対象会場以外の行はセル走査ごとスキップ（ページ内プリフィルタと同じ規約）
+        if not name or not _CENTER_RE.search(name):
+            continue
+        slots = []
+        for c in r.css("a, button, td"):
+            t = c.text(strip=True)
+            if "○" in t:
+                slots.append({"t": t, "href": c.attributes.get("href") or ""})
+        rows.append({"name": name, "slots": slots})
+    return collect_slots(rows, m_lb, d_lb)[0]
+
+# IPA側の混雑ページ/ボット対策ページの典型文言。HTTPでこれを踏んだら
+# 素直にPlaywrightへ退避する（ブラウザ相当のアクセスなら通ることがある）
+_BOT_RE = re.compile(r"アクセスが集中|自動(的な)?アクセス|しばらく時間をおいて")
+
+class _BotBlocked(Exception):
+    """HTTP直叩きがアンチボット応答を踏んだ（Playwrightへフォールバック）"""
+
+async def _fetch(sess, method: str, url: str, step: str, **kw):
+    """429/5xxを指数バックオフで3回まで再試行し (status, body, 実URL) を返す"""
+    status = 0
+    for attempt in range(3):
+        async with sess.request(method, url, **kw) as r:
+            status = r.status
+            if status == 429 or status >= 500:
+                wait = 0.5 * (2 ** attempt) + random.uniform(0, 0.3)
+                warn_mark(step, f"{method} {status}（{wait:.1f}s後に再試行）")
+                await asyncio.sleep(wait)
+                continue
+            body = await r.text()
+            if _BOT_RE.search(body):
+                raise _BotBlocked(f"{step}: アンチボット応答")
+            return status, body, str(r.url)
+    return status, "", url
+
+async def run_http():
+    """HTTP直叩きで月×日を総当たり。完走できない構成なら None（要フォールバック）"""
+    conn = aiohttp.TCPConnector(limit_per_host=4, ttl_dns_cache=300, ssl=SSL_CTX)
+    async with aiohttp.ClientSession(connector=conn) as sess:
+        # 1) ログインフォームを収集してPOST
+        status, body, login_base = await _fetch(sess, "GET", IPA_LOGIN_URL, "HTTPログイン")
+        if status != 200:
+            warn_mark("HTTPログイン", f"GET {status}"); return None
+        doc = HTMLParser(body)
+        lf = _login_form(doc, login_base)
+        if not lf:
+            warn_mark("HTTPログイン", "ログインフォームを特定できず"); return None
+        action, data, id_name, pw_name = lf
+        data[id_name] = IPA_USER_ID
+        data[pw_name] = IPA_PASSWORD
+        status, body, _ = await _fetch(sess, "POST", action, "HTTPログイン", data=data)
+        if status >= 400:
+            warn_mark("HTTPログイン", f"POST {status}"); return None
+        if "ログアウト" not in body:
+            warn_mark("HTTPログイン", "ログイン成功を確認できず"); return None
+        pass_mark("HTTPログイン", "成功")
+
+        # 2) エリア・日程ページの検索フォームを収集
+        status, body, page_url = await _fetch(sess, "GET", IPA_FE_ENTRY_URL, "HTTP導線")
+        if status != 200:
+            warn_mark("HTTP導線", f"GET {status}"); return None
+        doc = HTMLParser(body)
+        metas = {sid: _select_meta(doc, sid)
+                 for sid in ("select_area", "select_pref", "select_ym", "select_dt")}
+        if any(m is None for m in metas.values()):
+            warn_mark("HTTP導線", "エリア・日程のselect群が揃わない"); return None
+
+        form = next((f for f in doc.css("form")
+                     if f.css_first("select#select_area") is not None), None)
+        if form is None:
+            warn_mark("HTTP導線", "検索フォームが見つからない"); return None
+        search_action = urljoin(page_url, form.attributes.get("action") or "")
+        base_data = _hidden_fields(form)
+
+        def value_of(sid, label):
+            return next((v for v, lb in metas[sid][1] if lb == label), None)
+
+        area_val = value_of("select_area", REGION_NAME)
+        pref_val = value_of("select_pref", PREF_NAME)
+        if area_val is None or pref_val is None:
+            # 都道府県がXHRカスケードで静的に埋まっていない場合はここに落ちる
+            warn_mark("HTTP導線", "地域/都道府県の候補が静的に得られない"); return None
+
+        ym_opts = [(v, lb) for v, lb in metas["select_ym"][1]
+                   if (pm := parse_month_label(lb)) and pm >= _START_KEY]
+        dt_opts = [(v, lb) for v, lb in metas["select_dt"][1]
+                   if lb and "選択" not in lb]
+        if not ym_opts or not dt_opts:
+            warn_mark("HTTP導線", "月/日の候補が静的に得られない"); return None
+        pass_mark("HTTP導線", f"検索フォーム把握: 月{len(ym_opts)}×日{len(dt_opts)}")
+
+        # 3) (月,日)ごとの検索POSTを並列再現（セマフォで上限・送信間隔に揺らぎ）
+        sem = asyncio.Semaphore(HTTP_CONCURRENCY)
+
+        async def search_one(ym_val, ym_lb, dt_val, dt_lb) -> list:
+            data = dict(base_data)
+            data[metas["select_area"][0]] = area_val
+            data[metas["select_pref"][0]] = pref_val
+            data[metas["select_ym"][0]]   = ym_val
+            data[metas["select_dt"][0]]   = dt_val
+            async with sem:
+                await asyncio.sleep(random.uniform(0.2, 0.6))  # サーバへの礼儀
+                status, body, _ = await _fetch(
+                    sess, "POST", search_action, "HTTP検索", data=data)
+                if status != 200:
+                    warn_mark("HTTP検索", f"{ym_lb}/{dt_lb} POST {status}"); return []
+            return _parse_result_html(body, ym_lb, dt_lb)
+
+        found = set()  # Slotはfrozenなのでsetがそのまま重複排除になる
+        tasks = [asyncio.create_task(search_one(yv, yl, dv, dl))
+                 for yv, yl in ym_opts for dv, dl in dt_opts]
         try:
-            # --- ログイン ---
-            group_start("IPAログイン")
-            page.goto(IPA_LOGIN_URL, wait_until="domcontentloaded")
-            check(page.locator("form").first.count() > 0, "ログインページ", "フォーム検出", "フォーム見当たらず", True)
+            results = await asyncio.gather(*tasks)
+        except _BotBlocked as e:
+            # 1件でもアンチボット応答を踏んだら、残りのPOSTを打ち続けない。
+            # 生存タスクを止めて例外を回収してからフォールバックに譲る。
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            warn_mark("HTTP直叩き", str(e)); return None
+        for slots in results:
+            found.update(slots)
+        return found
 
-            try:
-                page.get_by_label("利用者ID", exact=True).fill(IPA_USER_ID, timeout=3000)
-                pass_mark("ID入力", "label=利用者ID")
-            except Exception:
-                fill_any(page, LOGIN_ID_CAND, IPA_USER_ID, "ID入力")
+# ===== メイン（Playwrightパス） =====
+def _state_cookies() -> dict:
+    """state.json（storage_state形式）からクッキーを {name: value} で取り出す"""
+    try:
+        with open(STATE_FILE) as f:
+            return {c["name"]: c["value"]
+                    for c in json.load(f).get("cookies", [])}
+    except (OSError, ValueError, KeyError):
+        return {}
 
-            try:
-                page.get_by_label("パスワード", exact=True).fill(IPA_PASSWORD, timeout=3000)
-                pass_mark("PW入力", "label=パスワード")
-            except Exception:
-                fill_any(page, LOGIN_PW_CAND, IPA_PASSWORD, "PW入力")
+async def probe_entry() -> str:
+    """Chromium起動前にエントリURLを素のGETで確認する。
+    'ok'=続行 / 'login'=セッション失効（再ログインから） /
+    'down'=メンテナンス等で今回はスキップ / 'unknown'=判定不能（続行）"""
+    try:
+        async with aiohttp.ClientSession(cookies=_state_cookies()) as sess:
+            async with sess.get(IPA_FE_ENTRY_URL, allow_redirects=False,
+                                ssl=SSL_CTX,
+                                timeout=aiohttp.ClientTimeout(total=10)) as r:
+                if r.status in (301, 302, 303):
+                    loc = r.headers.get("Location") or ""
+                    return "login" if "login" in loc else "unknown"
+                if r.status == 503:
+                    return "down"
+                if r.status == 200:
+                    body = await r.text()
+                    if _BOT_RE.search(body) or "メンテナンス" in body:
+                        return "down"
+                    return "ok"
+    except Exception as e:
+        warn_mark("事前プローブ", f"例外: {e}（続行）")
+    return "unknown"
 
-            if page.get_by_role("button", name="ログイン").first.count():
-                page.get_by_role("button", name="ログイン").first.click()
-            else:
-                page.locator("button:has-text('ログイン'), input[type='submit']").first.click()
-            page.wait_for_load_state("domcontentloaded")
+async def run_playwright() -> set:
+    found_slots = set()
+
+    # ブラウザ起動（5〜15秒）を払う前に、素のGETでサイトの生死と
+    # セッションの有効性だけ先に見る
+    probe = await probe_entry()
+    if probe == "down":
+        warn_mark("事前プローブ", "メンテナンス/混雑応答のため今回の巡回をスキップ")
+        return found_slots
+    if probe == "login":
+        info("事前プローブ: セッション失効（再ログインから開始）")
 
-            logged_in = page.locator("a:has-text('ログアウト'), button:has-text('ログアウト')").first.count() > 0
-            check(logged_in, "ログイン", "成功", "失敗の可能性", True)
+    async with async_playwright() as p:
+        # headless-shell版Chromium（軽量・起動が速い）＋CI向けの定番フラグ。
+        # shell版が未インストールの環境ではフルChromiumに落とす。
+        launch_kw = dict(headless=True, args=[
+            "--disable-dev-shm-usage",
+            "--no-sandbox",
+            "--disable-gpu",
+            "--disable-extensions",
+            "--disable-background-networking",
+        ])
+        try:
+            browser = await p.chromium.launch(
+                channel="chromium-headless-shell", **launch_kw)
+        except Exception:
+            browser = await p.chromium.launch(**launch_kw)
+
+        # --- 保存済みセッションの再利用（有効ならログイン一式を省略） ---
+        context = page = None
+        state_fresh = False
+        try:
+            state_fresh = time.time() - os.path.getmtime(STATE_FILE) < STATE_TTL_SEC
+        except OSError:
+            pass
+        if probe == "login":
+            state_fresh = False  # 失効済みセッションの再利用プローブを省く
+        if os.path.exists(STATE_FILE) and not state_fresh:
+            info(f"{STATE_FILE} は24時間より古いため破棄（再ログイン）")
+        if state_fresh:
+            group_start("セッション再利用")
+            ctx = await new_context_with_helpers(browser, storage_state=STATE_FILE)
+            pg = await ctx.new_page()
+            set_page_timeouts(pg)
+            try:
+                await pg.goto(IPA_FE_ENTRY_URL, wait_until="domcontentloaded")
+                if await on_area_date(pg) or await goto_area_date_page(pg, quiet=True):
+                    pass_mark("セッション再利用", f"{STATE_FILE} 有効・ログイン省略")
+                    context, page = ctx, pg
+                else:
+                    warn_mark("セッション再利用", "セッション失効の可能性（通常ログインへ）")
+                    await ctx.close()
+            except Exception as e:
+                warn_mark("セッション再利用", f"例外: {e}（通常ログインへ）")
+                await ctx.close()
             group_end()
 
-            # --- エリア・日程選択ページへ ---
-            ok = goto_area_date_page(page)
-            check(ok, "導線確認", "エリア・日程選択に到達", "ページ到達に失敗", True)
+        need_login = context is None
+        if need_login:
+            context = await new_context_with_helpers(browser)
+            page = await context.new_page()
+            set_page_timeouts(page)
+        try:
+            if need_login:
+                # --- ログイン ---
+                group_start("IPAログイン")
+                await page.goto(IPA_LOGIN_URL, wait_until="domcontentloaded")
+                check(await page.locator("form").first.count() > 0, "ログインページ", "フォーム検出", "フォーム見当たらず", True)
+
+                try:
+                    await page.get_by_label("利用者ID", exact=True).fill(IPA_USER_ID, timeout=3000)
+                    pass_mark("ID入力", "label=利用者ID")
+                except Exception:
+                    await fill_any(page, LOGIN_ID_CAND, IPA_USER_ID, "ID入力")
+
+                try:
+                    await page.get_by_label("パスワード", exact=True).fill(IPA_PASSWORD, timeout=3000)
+                    pass_mark("PW入力", "label=パスワード")
+                except Exception:
+                    await fill_any(page, LOGIN_PW_CAND, IPA_PASSWORD, "PW入力")
+
+                # ロール照会を正、素のsubmitだけを唯一のフォールバックに
+                login_btn = page.get_by_role("button", name="ログイン", exact=True).first
+                if not await login_btn.count():
+                    login_btn = page.locator("input[type='submit']").first
+                # ログイン成否は次でログアウトUIを見るので、その出現を直接待つ
+                await click_and_wait_for(login_btn, page, LOGOUT_SEL)
+
+                logged_in = await page.locator(LOGOUT_SEL).first.count() > 0
+                check(logged_in, "ログイン", "成功", "失敗の可能性", True)
+                group_end()
+
+                # --- エリア・日程選択ページへ ---
+                ok = await goto_area_date_page(page)
+                check(ok, "導線確認", "エリア・日程選択に到達", "ページ到達に失敗", True)
+
+                # 次回以降のログイン省略用にセッションを保存
+                await context.storage_state(path=STATE_FILE)
+                pass_mark("セッション保存", STATE_FILE)
 
             # --- エリア・日程選択 ---
             group_start("エリア/日程選択")
+            await select_area_pref(page)
 
-            # 1) 地域
-            select_by_label(page, "select_area", REGION_NAME)
-
-            # 都道府県の候補が埋まるまで（ラッパーも監視）
-            page.wait_for_function(
-                """
-                () => {
-                  const s = document.querySelector('#select_pref');
-                  const w = document.querySelector('#select_pref + .selecter');
-                  const okSel = s && s.options && s.options.length > 1;
-                  const okWrap = w && w.querySelectorAll('.selecter-item').length > 1;
-                  return okSel || okWrap;
-                }
-                """,
-                timeout=30000
-            )
-
-            # 2) 都道府県
-            select_by_label(page, "select_pref", PREF_NAME)
-
-            # 月・日が埋まるまで
-            page.wait_for_function(
-                """
-                () => {
-                  const y  = document.querySelector('#select_ym');
-                  const d  = document.querySelector('#select_dt');
-                  const yw = document.querySelector('#select_ym + .selecter');
-                  const dw = document.querySelector('#select_dt + .selecter');
-                  const okY = (y && y.options.length > 1) || (yw && yw.querySelectorAll('.selecter-item').length > 1);
-                  const okD = (d && d.options.length > 1) || (dw && dw.querySelectorAll('.selecter-item').length > 1);
-                  return okY && okD;
-                }
-                """,
-                timeout=30000
-            )
-
-            # 3) 月/日 オプション取得
-            ym_opts = options_of(page, "select_ym")
-            dt_opts = [o for o in options_of(page, "select_dt") if o["label"] and "選択" not in o["label"]]
-
-            sy, sm = map(int, START_YM.split("-"))
-            ym_labels = []
-            for o in ym_opts:
-                pm = parse_month_label(o["label"])
-                if pm and (pm[0] > sy or (pm[0] == sy and pm[1] >= sm)):
-                    ym_labels.append(o["label"])
+            # 月/日 オプション取得
+            ym_opts = await options_of(page, "select_ym")
+            dt_opts = [o for o in await options_of(page, "select_dt") if o["label"] and "選択" not in o["label"]]
+
+            ym_labels = [o["label"] for o in ym_opts
+                         if (pm := parse_month_label(o["label"])) and pm >= _START_KEY]
             if not ym_labels:
                 warn_mark("月", f"{START_YM} 以降の候補なし")
             if not dt_opts:
@@ -312,102 +925,199 @@ def main():
 
             group_end()
 
-            # --- 検索・抽出ループ ---
+            # --- 検索・抽出ループ（1コンテキスト内の複数ページで並列実行） ---
             group_start("検索・抽出ループ")
 
-            def click_search() -> bool:
-                # ページによっては #ACT_search が確実
-                btn = page.locator("#ACT_search").first
-                if not btn.count():
-                    btn = page.get_by_role("button", name="検索").first
-                if btn.count():
-                    btn.click()
-                    # 結果（表 or no-site）を待つ
-                    page.wait_for_function(
-                        "document.querySelector('#calendar tbody tr') || document.querySelector('.no-site')",
-                        timeout=20000
-                    )
-                    pass_mark("会場検索", "検索押下"); return True
-                warn_mark("会場検索", "ボタンなし"); return False
-
-            def extract_table_slots(selected_month: str, selected_day: str):
-                tables = page.locator("table")
-                if tables.count() == 0:
-                    warn_mark("会場表", "tableなし"); return
-                rows = tables.first.locator("tr")
-                matched = 0
-                for i in range(rows.count()):
-                    r = rows.nth(i)
-                    name = ""
-                    if r.locator("a").count():
-                        name = (r.locator("a").first.inner_text() or "").strip()
-                    else:
-                        try:
-                            name = (r.locator("td").first.inner_text() or "").strip()
-                        except Exception:
-                            name = ""
-                    if not name or not any(c in name for c in TARGET_CENTERS):
-                        continue
-
-                    matched += 1; pass_mark("会場一致", name)
-                    cells = r.locator("a:has-text('○'), button:has-text('○'), td:has-text('○')")
-                    cnt = cells.count()
-                    if cnt == 0:
-                        warn_mark("枠抽出", f"{name}: 0件"); continue
-                    for j in range(cnt):
-                        t = (cells.nth(j).inner_text() or "").strip()
-                        href = ""
-                        try: href = cells.nth(j).get_attribute("href") or ""
-                        except: pass
-                        line = f"{name} | {selected_month} | {selected_day} | {t}"
-                        if href: line += f" | {href}"
-                        found_lines.append(line)
-                    pass_mark("枠抽出", f"{name}: {cnt}件")
-                if matched == 0:
-                    warn_mark("会場一致", "指定会場ヒットなし（表記ぶれの可能性）")
+            # ログイン済みのCookie等を複製したウォームなコンテキストを1つだけ用意し、
+            # MAX_CONCURRENCY枚のページがキューから(月,日)を取り合う。
+            # 共有状態(found_lines)はシングルスレッドのasyncなのでロック不要。
+            state = await context.storage_state()
+            work_ctx = await new_context_with_helpers(browser, storage_state=state)
 
             loop_months = ym_labels if ym_labels else [""]
             loop_days   = dt_opts   if dt_opts   else [{"label": "任意"}]
 
+            work_q: asyncio.Queue = asyncio.Queue()
             for m_lb in loop_months:
-                if m_lb:
-                    if not select_by_label(page, "select_ym", m_lb):
-                        continue
                 for d in loop_days:
-                    d_lb = d["label"]
-                    if not select_by_label(page, "select_dt", d_lb):
-                        continue
-                    if click_search():
-                        extract_table_slots(m_lb or "(指定なし)", d_lb)
+                    work_q.put_nowait((m_lb, d["label"]))
+
+            # 検出した枠はキュー経由で即時通知する（全スキャン完了を待たない）
+            alert_q: asyncio.Queue = asyncio.Queue()
+
+            async def notifier():
+                while True:
+                    m_lb, d_lb, lines = await alert_q.get()
+                    try:
+                        lines = unnotified_lines(lines)
+                        if not lines:
+                            warn_mark("通知(メール)", f"{m_lb} {d_lb}: 通知済みの枠のみのためスキップ")
+                            continue
+                        body = (f"対象: 地域={REGION_NAME} / 都道府県={PREF_NAME}"
+                                f" / {m_lb} {d_lb}\n\n" + "\n".join(lines))
+                        if await send_gmail(
+                                "【CBTS/IPA】基本情報（沖縄3会場）空き枠を検出しました", body):
+                            remember_lines(lines)
+                    except Exception as e:
+                        # 通知の失敗（.slots.db破損等）で消費役を死なせない。
+                        # ここで例外が抜けると alert_q.join() が永久に戻らなくなる。
+                        fail_mark("速報通知", f"{m_lb} {d_lb}: 例外: {e}")
+                    finally:
+                        alert_q.task_done()
+
+            # 月ごとの「空きを出した会場」集合。全対象会場が埋まった月は
+            # 残りの日を捨てて他の月へ進む（EXHAUSTIVE=trueで無効化）
+            month_hits: dict = {}
+            skip_months: set = set()
+            # 月ごとの「対象会場の行ゼロ」連続回数。会場は月単位で開くので、
+            # 月初側の数日で行が一つも出ない月は残り全日も出ないとみなす。
+            # 一度でも行が出た月は -1 を入れてスキップ対象から外す。
+            month_miss: dict = {}
+            MISS_LIMIT = 2
+
+            def report(m_lb: str, d_lb: str, slots: list, matched: int = -1):
+                # 既出のSlotを除いた新規分だけ速報に回す
+                new = [s for s in slots if s not in found_slots]
+                found_slots.update(slots)
+                if new:
+                    alert_q.put_nowait((m_lb, d_lb, [s.line() for s in new]))
+                hits = month_hits.setdefault(m_lb, set())
+                for s in slots:
+                    hits.update(c for c in TARGET_CENTERS if c in s.name)
+                if EXHAUSTIVE or m_lb in skip_months:
+                    return
+                if len(hits) == len(TARGET_CENTERS):
+                    skip_months.add(m_lb)
+                    info(f"{m_lb}: 全対象会場で空き検出済みのため残りの日をスキップ")
+                    return
+                if matched > 0:
+                    month_miss[m_lb] = -1
+                elif matched == 0 and month_miss.get(m_lb, 0) >= 0:
+                    month_miss[m_lb] = month_miss.get(m_lb, 0) + 1
+                    if month_miss[m_lb] >= MISS_LIMIT:
+                        skip_months.add(m_lb)
+                        info(f"{m_lb}: 対象会場の行が出ないため残りの日をスキップ")
+
+            async def worker(idx: int):
+                pg = await work_ctx.new_page()
+                set_page_timeouts(pg)
+                try:
+                    await pg.goto(IPA_FE_ENTRY_URL, wait_until="domcontentloaded")
+                    if not await on_area_date(pg):
+                        if not await goto_area_date_page(pg, quiet=True):
+                            warn_mark("並列導線", f"worker{idx} 到達失敗"); return
+                    await select_area_pref(pg)
+                    # ラベル→値を一度だけ引いてキャッシュ（月変更で日が入れ替わる時のみ再取得）
+                    ym_map = await label_value_map(pg, "select_ym")
+                    dt_map = await label_value_map(pg, "select_dt")
+                    while not work_q.empty():
+                        m_lb, d_lb = work_q.get_nowait()
+                        # skip_months等はreportと同じ正規化キーで引く
+                        # （月候補なしフォールバック時は m_lb が空文字）
+                        month_key = m_lb or "(指定なし)"
+                        if month_key in skip_months:
+                            continue
+                        try:
+                            if m_lb and m_lb not in ym_map:
+                                fail_mark("選択", f"select_ym '{m_lb}' 候補になし"); continue
+                            if m_lb and d_lb not in dt_map:
+                                dt_map = await label_value_map(pg, "select_dt")
+                            if d_lb not in dt_map:
+                                fail_mark("選択", f"select_dt '{d_lb}' 候補になし"); continue
+                            # 選択→検索→結果待ち→表JSON化をページ内で融合実行（CDP往復1回）
+                            res = await pg.evaluate(
+                                "a => window.__probeYmDt(a.ym, a.dt, a.timeout, a.centers)",
+                                {"ym": ym_map[m_lb] if m_lb else None,
+                                 "dt": dt_map[d_lb], "timeout": 20000,
+                                 "centers": TARGET_CENTERS}
+                            )
+                            if res["status"] == "OK":
+                                pass_mark("会場検索", f"{month_key}/{d_lb}")
+                                slots, matched = collect_slots(
+                                    res["rows"], month_key, d_lb)
+                                report(month_key, d_lb, slots, matched)
+                                continue
+                            # 融合実行が失敗した(月,日)だけ従来の逐次パスで救済
+                            warn_mark("会場検索", f"融合実行 {res['status']}（逐次へフォールバック）")
+                            if m_lb and not await select_by_value(pg, "select_ym", ym_map[m_lb], m_lb):
+                                continue
+                            if not await select_by_value(pg, "select_dt", dt_map[d_lb], d_lb):
+                                continue
+                            if await click_search(pg):
+                                slots, matched = await extract_table_slots(
+                                    pg, month_key, d_lb)
+                                report(month_key, d_lb, slots, matched)
+                        except Exception as e:
+                            warn_mark("並列検索", f"({m_lb}/{d_lb}) 例外: {e}")
+                finally:
+                    await pg.close()
+
+            notifier_task = asyncio.create_task(notifier())
+            try:
+                await asyncio.gather(*[worker(i) for i in range(MAX_CONCURRENCY)])
+                await alert_q.join()  # 積み残しの速報を送り切ってから畳む
+            finally:
+                notifier_task.cancel()
+            await work_ctx.close()
 
             group_end()
 
-            # --- ログアウト（任意） ---
-            group_start("ログアウト")
-            lg = page.locator("a:has-text('ログアウト'), button:has-text('ログアウト')").first
-            if lg.count():
-                lg.click(); page.wait_for_load_state("domcontentloaded"); pass_mark("ログアウト", "成功")
-            else:
-                warn_mark("ログアウト", "UIなし（自然失効想定）")
+            # --- ログアウトはしない（state.json のセッションを次回再利用するため） ---
+            group_start("セッション維持")
+            info(f"ログアウトせず終了（{STATE_FILE} を次回再利用）")
             group_end()
 
         finally:
-            context.close(); browser.close()
+            await context.close(); await browser.close()
+    return found_slots
+
+async def main():
+    # HTTP_MODE=true ならまずHTTP直叩きで試し、完走できなければ
+    # （アンチボット応答を含む）Playwrightに切り替える
+    found = None
+    group_start("HTTP直叩き")
+    if HTTP_MODE:
+        try:
+            found = await run_http()
+        except _BotBlocked as e:
+            warn_mark("HTTP直叩き", str(e))
+        except Exception as e:
+            warn_mark("HTTP直叩き", f"例外: {e}")
+    else:
+        warn_mark("HTTP直叩き", "HTTP_MODE=false のためスキップ")
+    streamed = False
+    if found is None:
+        if HTTP_MODE:
+            warn_mark("HTTP直叩き", "完走できず（Playwrightへフォールバック）")
+        group_end()
+        found = await run_playwright()
+        streamed = True  # Playwrightパスは検出時に速報送信済み
+    else:
+        pass_mark("HTTP直叩き", f"完走: {len(found)}件")
+        group_end()
 
     # --- 実行まとめ ---
     group_start("実行まとめ")
-    info(f"検出件数: {len(found_lines)}")
-    if found_lines:
-        pass_mark("実行結果", f"空き枠 {len(found_lines)}件 検出")
-        body = f"対象: 地域={REGION_NAME} / 都道府県={PREF_NAME} / 開始月={START_YM}\n\n" + "\n".join(found_lines)
-        send_gmail("【CBTS/IPA】基本情報（沖縄3会場）空き枠を検出しました", body)
+    info(f"検出件数: {len(found)}")
+    if found:
+        pass_mark("実行結果", f"空き枠 {len(found)}件 検出")
+        if not streamed:
+            lines = unnotified_lines(sorted(s.line() for s in found))
+            if lines:
+                body = (f"対象: 地域={REGION_NAME} / 都道府県={PREF_NAME} / 開始月={START_YM}\n\n"
+                        + "\n".join(lines))
+                if await send_gmail(
+                        "【CBTS/IPA】基本情報（沖縄3会場）空き枠を検出しました", body):
+                    remember_lines(lines)
+            else:
+                warn_mark("通知(メール)", "全件通知済みのためスキップ")
     else:
         warn_mark("実行結果", "空き枠は検出されませんでした")
     group_end()
 
 if __name__ == "__main__":
     try:
-        main()
+        asyncio.run(main())
         print("::notice title=Job Summary::スクリプトは正常終了（空き無しも成功扱い）")
     except Exception as e:
         print(f"::error title=Job Summary::致命的な例外で終了: {e}")